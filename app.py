@@ -1,13 +1,16 @@
+import collections
 import json
+import math
 import os
-import queue
 import random
 import threading
 import time
 import uuid
 from pathlib import Path
+from urllib.parse import quote
 
-from flask import Flask, jsonify, render_template, request, send_file
+import orjson
+from flask import Flask, Response, jsonify, render_template, request, send_file
 
 
 BASE_DIR = Path(__file__).parent
@@ -30,40 +33,63 @@ DEFAULT_CONFIG = {
     "sfx_enabled": True,
 }
 
+_GPIO = None
+_gpio_lock = threading.Lock()
+
+
+def _gpio():
+    # Import RPi.GPIO and select BCM numbering once for every hardware user.
+    global _GPIO
+    with _gpio_lock:
+        if _GPIO is None:
+            import RPi.GPIO as GPIO
+
+            GPIO.setmode(GPIO.BCM)
+            _GPIO = GPIO
+        return _GPIO
+
+
+# (cycle_size, wins) -> win bitmask; the spread is deterministic so it is built once per shape.
+_PATTERN_CACHE: dict[tuple[int, int], int] = {}
+
+
+def _win_mask(cycle_size: int, wins: int) -> int:
+    mask = _PATTERN_CACHE.get((cycle_size, wins))
+    if mask is not None:
+        return mask
+    mask = 0
+    if wins:
+        step = cycle_size / wins
+        for i in range(wins):
+            pos = int(round(i * step)) % cycle_size
+            # Avoid duplicates by walking forward if necessary.
+            while mask >> pos & 1:
+                pos = (pos + 1) % cycle_size
+            mask |= 1 << pos
+    _PATTERN_CACHE[(cycle_size, wins)] = mask
+    return mask
+
+
 # Simple cycle that pre-determines wins ahead of time rather than relying on randomness.
 class RiggedOutcomePlanner:
     def __init__(self, win_ratio: float, cycle_size: int = 20):
         self.cycle_size = max(1, cycle_size)
         self._lock = threading.Lock()
         self._index = 0
-        self._pattern = []
+        # Bit i set means slot i of the cycle is a win.
+        self._mask = 0
         self.set_ratio(win_ratio)
 
     def set_ratio(self, win_ratio: float):
         with self._lock:
             ratio = min(1.0, max(0.0, win_ratio))
-            wins = round(self.cycle_size * ratio)
-            pattern = [False] * self.cycle_size
-            if wins:
-                step = self.cycle_size / wins
-                used = set()
-                for i in range(wins):
-                    pos = int(round(i * step)) % self.cycle_size
-                    # Avoid duplicates by walking forward if necessary.
-                    while pos in used:
-                        pos = (pos + 1) % self.cycle_size
-                    used.add(pos)
-                    pattern[pos] = True
-            self._pattern = pattern
-            self._index = self._index % len(self._pattern)
+            self._mask = _win_mask(self.cycle_size, round(self.cycle_size * ratio))
 
     def next(self) -> bool:
-        with self._lock:
-            if not self._pattern:
-                return False
-            result = self._pattern[self._index]
-            self._index = (self._index + 1) % len(self._pattern)
-            return result
+        # Lock-free: the index and mask are plain ints swapped in by single assignments.
+        idx = self._index
+        self._index = (idx + 1) % self.cycle_size
+        return bool(self._mask >> idx & 1)
 
 
 class SymbolWheel:
@@ -73,22 +99,16 @@ class SymbolWheel:
         self._lock = threading.Lock()
         self._cursor = 0
 
-    def _next_symbol(self):
-        symbol = self.SYMBOLS[self._cursor % len(self.SYMBOLS)]
-        self._cursor = (self._cursor + 1) % len(self.SYMBOLS)
-        return symbol
-
     def next_reels(self, is_win: bool):
+        symbols = self.SYMBOLS
         with self._lock:
-            base = self._next_symbol()
-            if is_win:
-                return [base, base, base]
-            second = self._next_symbol()
-            third = self._next_symbol()
-            # Ensure we do not accidentally show three of a kind on a loss.
-            if third == base:
-                third = self._next_symbol()
-            return [base, second, third]
+            cursor = self._cursor
+            self._cursor = (cursor + 1) % len(symbols)
+        base = symbols[cursor]
+        if is_win:
+            return [base, base, base]
+        # Offsets 2 and 4 on a six-symbol wheel never collide, so a loss is never three of a kind.
+        return [base, symbols[(cursor + 2) % len(symbols)], symbols[(cursor + 4) % len(symbols)]]
 
 
 class ConfigStore:
@@ -97,26 +117,53 @@ class ConfigStore:
         self._lock = threading.Lock()
         self._data = DEFAULT_CONFIG.copy()
         self._load()
+        self._snapshot = dict(self._data)
+        self._json_bytes = orjson.dumps(self._data)
 
     def _load(self):
         if self.path.exists():
             try:
-                raw = json.loads(self.path.read_text())
+                content = self.path.read_bytes()
+                try:
+                    raw = orjson.loads(content)
+                except orjson.JSONDecodeError:
+                    # Older configs may hold NaN/Infinity, which only the stdlib parser accepts.
+                    raw = json.loads(content)
+                ratio = raw.get("win_ratio")
+                if isinstance(ratio, bool) or not isinstance(ratio, (int, float)) or not math.isfinite(ratio):
+                    # Keep the default rather than hand the planner something it cannot compare.
+                    raw.pop("win_ratio", None)
                 self._data.update(raw)
             except Exception:
                 # Use defaults if the config is malformed.
                 pass
         else:
-            self.save(self._data)
+            self._write(self._data)
+
+    def _write(self, data: dict):
+        # Write to a temp file and swap it in so a crash never leaves a half-written config.
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp, self.path)
 
     def get(self):
-        with self._lock:
-            return dict(self._data)
+        # Shared read-only snapshot; callers must not mutate it.
+        return self._snapshot
+
+    def json_bytes(self):
+        # Compact JSON of the current config, re-encoded only when it changes.
+        return self._json_bytes
 
     def save(self, data: dict):
         with self._lock:
-            self._data.update(data)
-            self.path.write_text(json.dumps(self._data, indent=2))
+            new = {**self._data, **data}
+            if new == self._data:
+                # Nothing changed, skip the disk write.
+                return
+            self._write(new)
+            self._data = new
+            self._snapshot = dict(new)
+            self._json_bytes = orjson.dumps(new)
 
 
 class StepperMotor:
@@ -131,9 +178,13 @@ class StepperMotor:
         [0, 0, 0, 1],
         [1, 0, 0, 1],
     ]
+    STEP_PERIOD_NS = 2_000_000
 
     def __init__(self, pins):
         self.pins = pins
+        # RPi.GPIO accepts a channel tuple with matching values, so each half-step is one call.
+        self._pins = tuple(pins)
+        self._schedule = [tuple(seq) for seq in self.SEQUENCE]
         self.gpio = None
         self._available = False
         self._spin_lock = threading.Lock()
@@ -141,10 +192,7 @@ class StepperMotor:
 
     def _setup_gpio(self):
         try:
-            import RPi.GPIO as GPIO
-
-            self.gpio = GPIO
-            GPIO.setmode(GPIO.BCM)
+            GPIO = self.gpio = _gpio()
             for pin in self.pins:
                 GPIO.setup(pin, GPIO.OUT)
                 GPIO.output(pin, 0)
@@ -157,11 +205,15 @@ class StepperMotor:
         if self._available and self.gpio:
             self.gpio.cleanup()
 
-    def _step_once(self):
-        for seq in self.SEQUENCE:
-            for pin, value in zip(self.pins, seq):
-                self.gpio.output(pin, value)
-            time.sleep(0.002)
+    def _step_once(self, next_step: int):
+        output = self.gpio.output
+        pins = self._pins
+        for values in self._schedule:
+            output(pins, values)
+            # Sleep to an absolute deadline so a late wake-up shortens the next wait.
+            next_step += self.STEP_PERIOD_NS
+            time.sleep(max(0, (next_step - time.monotonic_ns()) / 1e9))
+        return next_step
 
     def spin_for_seconds(self, duration=3.0):
         if not self._available:
@@ -172,10 +224,11 @@ class StepperMotor:
             return
 
         def _spin():
-            end_time = time.time() + duration
+            next_step = time.monotonic_ns()
+            deadline = next_step + int(duration * 1e9)
             try:
-                while time.time() < end_time:
-                    self._step_once()
+                while next_step < deadline:
+                    next_step = self._step_once(next_step)
             finally:
                 self._spin_lock.release()
 
@@ -186,40 +239,55 @@ class IRListener:
     def __init__(self, pin, on_trigger):
         self.pin = pin
         self.on_trigger = on_trigger
-        self.gpio = None
+        self._pi = None
+        self._cb = None
         self._available = False
         self._setup()
 
     def _setup(self):
         try:
-            import RPi.GPIO as GPIO
-
-            self.gpio = GPIO
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-            self.gpio.add_event_detect(
+            import pigpio
+
+            self._pi = pigpio.pi()
+            if not self._pi.connected:
+                # pigpiod daemon is not running.
+                raise RuntimeError("pigpio daemon unavailable")
+            self._pi.set_mode(self.pin, pigpio.INPUT)
+            self._pi.set_pull_up_down(self.pin, pigpio.PUD_DOWN)
+            self._cb = self._pi.callback(
                 self.pin,
-                self.gpio.RISING,
-                callback=lambda channel: self.on_trigger("ir"),
-                bouncetime=400,
+                pigpio.RISING_EDGE,
+                lambda gpio, level, tick: self.on_trigger("ir"),
             )
             self._available = True
         except Exception:
             self._available = False
 
     def cleanup(self):
-        if self._available and self.gpio:
-            self.gpio.cleanup()
+        if self._cb:
+            self._cb.cancel()
+        if self._pi:
+            self._pi.stop()
 
 
 class Runtime:
+    ID_POOL_SIZE = 256
+    # IR edges closer together than this are treated as sensor bounce.
+    IR_DEBOUNCE_NS = 400_000_000
+
     def __init__(self):
         self.config = ConfigStore(CONFIG_PATH)
         current_config = self.config.get()
         self.rigged = RiggedOutcomePlanner(current_config["win_ratio"])
         self.symbol_wheel = SymbolWheel()
-        self.events = queue.Queue()
+        self.events = collections.deque(maxlen=1024)
+        self._event_ready = threading.Event()
+        # Event ids are generated ahead of time so the trigger path skips the urandom syscall.
+        self._id_pool = collections.deque()
+        self._id_pool_low = threading.Event()
+        self._id_pool_low.set()
         self.stepper = StepperMotor(STEPPER_PINS)
+        self._last_ir_ns = -self.IR_DEBOUNCE_NS
         self.ir_listener = IRListener(IR_PIN, self.register_trigger)
         self.started = False
         self._start_lock = threading.Lock()
@@ -229,29 +297,80 @@ class Runtime:
             if self.started:
                 return
             # No continuous loop required; IR listener uses interrupts.
+            threading.Thread(target=self._refill_ids, daemon=True).start()
             self.started = True
 
+    def _refill_ids(self):
+        while True:
+            self._id_pool_low.wait()
+            self._id_pool_low.clear()
+            missing = self.ID_POOL_SIZE - len(self._id_pool)
+            if missing <= 0:
+                continue
+            raw = os.urandom(16 * missing)
+            self._id_pool.extend(
+                str(uuid.UUID(bytes=raw[i : i + 16], version=4)) for i in range(0, len(raw), 16)
+            )
+
+    def _next_event_id(self):
+        try:
+            event_id = self._id_pool.popleft()
+        except IndexError:
+            event_id = str(uuid.uuid4())
+        if len(self._id_pool) < self.ID_POOL_SIZE // 4:
+            self._id_pool_low.set()
+        return event_id
+
     def register_trigger(self, source: str = "ir"):
+        # Only the sensor is debounced; simulator and manual spins always go through.
+        if source == "ir":
+            now = time.monotonic_ns()
+            if now - self._last_ir_ns < self.IR_DEBOUNCE_NS:
+                return
+            self._last_ir_ns = now
         is_win = self.rigged.next()
         reels = self.symbol_wheel.next_reels(is_win)
         event = {
-            "id": str(uuid.uuid4()),
+            "id": self._next_event_id(),
             "win": is_win,
             "reels": reels,
             "source": source,
-            "created_at": time.time(),
+            # Integer epoch milliseconds; wall-clock because the UI shows it as a time of day.
+            "created_at": time.time_ns() // 1_000_000,
         }
-        self.events.put(event)
+        self.events.append(event)
+        self._event_ready.set()
         if is_win:
             self.stepper.spin_for_seconds()
 
-    def get_next_event(self):
-        if self.events.empty():
-            return None
-        try:
-            return self.events.get_nowait()
-        except queue.Empty:
-            return None
+    def _wait_for_event(self, timeout: float):
+        # Clear before re-checking so an append landing in between still wakes us.
+        self._event_ready.clear()
+        if self.events:
+            return True
+        return self._event_ready.wait(timeout)
+
+    def drain_events(self, timeout: float = 0, limit: int | None = None):
+        if timeout and not self.events:
+            self._wait_for_event(timeout)
+        # deque append/popleft are atomic, so producers and consumers need no lock.
+        drained = []
+        while limit is None or len(drained) < limit:
+            try:
+                drained.append(self.events.popleft())
+            except IndexError:
+                break
+        return drained
+
+    def requeue_events(self, events: list):
+        # Put undelivered events back at the front, keeping their original order.
+        # extendleft on a full deque would evict the newest triggers from the right,
+        # so only requeue what fits; like append, overflow drops the oldest events.
+        room = self.events.maxlen - len(self.events)
+        if room <= 0:
+            return
+        self.events.extendleft(reversed(events[-room:]))
+        self._event_ready.set()
 
     def update_config(self, win_ratio: float, simulator_mode: bool, music_enabled: bool, sfx_enabled: bool):
         self.rigged.set_ratio(win_ratio)
@@ -270,13 +389,21 @@ class Runtime:
 
 
 runtime = Runtime()
+runtime.ensure_started()
 app = Flask(__name__)
+# Hand audio off to the front-end server instead of streaming it through Python.
+# Only enable these when running behind Apache (mod_xsendfile) or nginx respectively.
+app.config["USE_X_SENDFILE"] = bool(os.environ.get("LOOTBIN_X_SENDFILE"))
+X_ACCEL_PREFIX = os.environ.get("LOOTBIN_X_ACCEL_PREFIX")
+
+# Bodies for responses that never change, encoded once.
+_HEALTH_BODY = b'{"status":"ok"}'
+_QUEUED_BODY = b'{"status":"queued"}'
+_NO_EVENT_BODY = b'{"eventAvailable":false}'
 
 
-@app.before_request
-def _start_runtime():
-    # Flask 3 dropped before_first_request, so ensure on every request instead.
-    runtime.ensure_started()
+def _json_body(body: bytes):
+    return Response(body, mimetype="application/json")
 
 
 @app.route("/")
@@ -292,7 +419,7 @@ def settings():
 @app.route("/api/config", methods=["GET", "POST"])
 def api_config():
     if request.method == "GET":
-        return jsonify(runtime.config.get())
+        return _json_body(runtime.config.json_bytes())
 
     payload = request.get_json(force=True, silent=True) or {}
     win_ratio = payload.get("win_ratio", DEFAULT_CONFIG["win_ratio"])
@@ -304,6 +431,8 @@ def api_config():
         win_ratio_value = float(win_ratio)
     except (TypeError, ValueError):
         return jsonify({"error": "Invalid win_ratio"}), 400
+    if not math.isfinite(win_ratio_value):
+        return jsonify({"error": "Invalid win_ratio"}), 400
 
     runtime.update_config(
         win_ratio_value,
@@ -311,15 +440,40 @@ def api_config():
         bool(music_enabled),
         bool(sfx_enabled),
     )
-    return jsonify(runtime.config.get())
+    return _json_body(runtime.config.json_bytes())
 
 
 @app.route("/api/next-event")
 def api_next_event():
-    event = runtime.get_next_event()
-    if not event:
-        return jsonify({"eventAvailable": False})
-    return jsonify({"eventAvailable": True, **event})
+    # Optional long-poll: ?wait=30 blocks until an event arrives or the timeout passes.
+    wait = min(max(request.args.get("wait", 0, type=float), 0), 60)
+    # Clients opt into batches with ?batch=1; others keep the one-event-per-call shape.
+    batch = request.args.get("batch", type=int)
+    events = runtime.drain_events(wait, limit=16 if batch else 1)
+    if not events:
+        return _json_body(_NO_EVENT_BODY)
+    if batch:
+        return jsonify({"eventAvailable": True, "events": events})
+    return jsonify({"eventAvailable": True, **events[0]})
+
+
+@app.route("/api/events/stream")
+def api_events_stream():
+    def _stream():
+        while True:
+            events = runtime.drain_events(timeout=30)
+            for i, event in enumerate(events):
+                try:
+                    yield f"data: {json.dumps({'eventAvailable': True, **event})}\n\n"
+                except GeneratorExit:
+                    # The client went away mid-batch; requeue what it never got for the next listener.
+                    runtime.requeue_events(events[i:])
+                    raise
+            if not events:
+                # Comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+
+    return Response(_stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.route("/api/simulate-hit", methods=["POST"])
@@ -328,31 +482,47 @@ def api_simulate_hit():
     if not config.get("simulator_mode", False):
         return jsonify({"error": "Simulator mode disabled"}), 400
     runtime.register_trigger("simulator")
-    return jsonify({"status": "queued"})
+    return _json_body(_QUEUED_BODY)
 
 
 @app.route("/api/test-spin", methods=["POST"])
 def api_test_spin():
     # Quick endpoint to trigger a spin without touching hardware (used by UI button).
     runtime.register_trigger("manual")
-    return jsonify({"status": "queued"})
+    return _json_body(_QUEUED_BODY)
 
 
 @app.route("/health")
 def health():
-    return jsonify({"status": "ok"})
+    return _json_body(_HEALTH_BODY)
+
+
+# Directory -> (mtime_ns, mp3 files); rebuilt only when the directory changes.
+_audio_cache: dict[Path, tuple[int, list[Path]]] = {}
 
 
 def _pick_audio_file(directory: Path, exclude: set[str] | None = None):
-    if not directory.exists() or not directory.is_dir():
+    try:
+        mtime = directory.stat().st_mtime_ns
+        cached = _audio_cache.get(directory)
+        if cached and cached[0] == mtime:
+            candidates = cached[1]
+        else:
+            candidates = [p for p in directory.iterdir() if p.suffix.lower() == ".mp3" and p.is_file()]
+            _audio_cache[directory] = (mtime, candidates)
+    except OSError:
         return None
-    exclude = exclude or set()
-    candidates = [
-        p for p in directory.iterdir() if p.suffix.lower() == ".mp3" and p.is_file() and p.name not in exclude
-    ]
+    if exclude:
+        candidates = [p for p in candidates if p.name not in exclude]
     if not candidates:
         return None
-    return random.choice(candidates)
+    return candidates[random.randrange(len(candidates))]
+
+
+# Fixed audio files are resolved once at startup; None means the file is missing.
+_VICTORY_PATH = VICTORY_FILE if VICTORY_FILE.exists() else None
+_CHING_PATH = CHING_FILE if CHING_FILE.exists() else None
+_WIN_PATH = GONA_WIN_FILE if GONA_WIN_FILE.exists() else None
 
 
 @app.route("/media/<kind>")
@@ -360,23 +530,26 @@ def media(kind: str):
     kind = kind.lower()
     path = None
     mimetype = "audio/mpeg"
+    # Only the fixed files may be cached; win/loose otherwise pick a random track per call.
+    fixed = kind in ("victory", "ching") or (kind == "win" and _WIN_PATH is not None)
     if kind == "victory":
-        path = VICTORY_FILE
+        path = _VICTORY_PATH
     elif kind == "ching":
-        path = CHING_FILE
+        path = _CHING_PATH
         mimetype = "audio/wav"
     elif kind == "win":
-        if GONA_WIN_FILE.exists():
-            path = GONA_WIN_FILE
-        else:
-            path = _pick_audio_file(WIN_DIR, exclude={VICTORY_FILE.name})
+        path = _WIN_PATH or _pick_audio_file(WIN_DIR, exclude={VICTORY_FILE.name})
     elif kind == "loose":
         path = _pick_audio_file(LOOSE_DIR)
 
-    if not path or not path.exists():
+    if not path:
         return jsonify({"error": "Audio not found"}), 404
 
-    return send_file(path, mimetype=mimetype, conditional=True)
+    if X_ACCEL_PREFIX:
+        # Percent-encode so names with spaces or non-Latin-1 characters stay valid header values.
+        location = f"{X_ACCEL_PREFIX.rstrip('/')}/{quote(path.relative_to(SOUNDS_DIR).as_posix())}"
+        return Response(headers={"X-Accel-Redirect": location}, mimetype=mimetype)
+    return send_file(path, mimetype=mimetype, conditional=True, max_age=86400 if fixed else None)
 
 
 def _shutdown():
@@ -389,5 +562,11 @@ atexit.register(_shutdown)
 
 
 if __name__ == "__main__":
-    runtime.ensure_started()
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
+    port = int(os.environ.get("PORT", 5000))
+    if os.environ.get("FLASK_DEBUG"):
+        app.run(host="0.0.0.0", port=port, debug=True)
+    else:
+        from waitress import serve
+
+        # Threaded so long-lived event streams don't block media and API requests.
+        serve(app, host="0.0.0.0", port=port, threads=8)
@@ -88,6 +88,8 @@ async function initHome() {
     settleDelay: 350,
     maxDuration: 0,
   };
+  // Events that arrive mid-spin wait here so each one gets its own spin.
+  const pendingSpins = [];
 
   const audioPrefs = {
     music: true,
@@ -110,14 +112,20 @@ async function initHome() {
     audio.play().catch(() => {});
   }
 
+  // Fixed clips are cacheable server-side; only the random "loose" pick needs a cache-buster.
+  // "win" replies are either the fixed clip or an uncached random pick, so it can skip it too.
+  function mediaUrl(kind) {
+    return kind === "loose" ? `/media/${kind}?t=${Date.now()}` : `/media/${kind}`;
+  }
+
   function playMusic(kind) {
     if (!audioPrefs.music) return;
-    playAudio(`/media/${kind}?t=${Date.now()}`, kind === "victory" ? 0.9 : 0.6);
+    playAudio(mediaUrl(kind), kind === "victory" ? 0.9 : 0.6);
   }
 
   function playSfx(kind) {
     if (!audioPrefs.sfx) return;
-    playAudio(`/media/${kind}?t=${Date.now()}`, 0.85);
+    playAudio(mediaUrl(kind), 0.85);
   }
 
   await loadAudioPrefs();
@@ -236,6 +244,7 @@ async function initHome() {
       if (spinState.isWin) {
         playMusic("victory");
       }
+      startNextSpin();
     }
   }
 
@@ -256,7 +265,7 @@ async function initHome() {
   }
 
   function logEvent(event) {
-    const ts = new Date(event.created_at * 1000).toLocaleTimeString();
+    const ts = new Date(event.created_at).toLocaleTimeString();
     const text = `${ts} · ${event.source.toUpperCase()} · ${event.win ? "WIN" : "LOSS"} · ${event.reels.join(" | ")}`;
     const line = document.createElement("div");
     line.textContent = text;
@@ -266,21 +275,46 @@ async function initHome() {
     }
   }
 
+  function startNextSpin() {
+    const event = pendingSpins.shift();
+    if (!event) return;
+    spin(event);
+    logEvent(event);
+  }
+
+  function handleEvent(data) {
+    if (!data.eventAvailable) return;
+    pendingSpins.push(...(data.events || [data]));
+    if (!spinState.active) {
+      startNextSpin();
+    }
+  }
+
   async function pollEvents() {
     while (true) {
       try {
-        const data = await fetchJSON("/api/next-event");
-        if (data.eventAvailable) {
-          spin(data);
-          logEvent(data);
-        }
+        // Long-poll: the backend holds the request until events arrive, then returns them in a batch.
+        handleEvent(await fetchJSON("/api/next-event?wait=25&batch=1"));
       } catch (err) {
         statusMessage.textContent = "Unable to reach backend.";
+        await sleep(900);
       }
-      await sleep(900);
     }
   }
 
+  function listenEvents() {
+    if (!window.EventSource) {
+      pollEvents();
+      return;
+    }
+    const source = new EventSource("/api/events/stream");
+    source.onmessage = (e) => handleEvent(JSON.parse(e.data));
+    source.onerror = () => {
+      // EventSource reconnects on its own; just surface the outage.
+      statusMessage.textContent = "Unable to reach backend.";
+    };
+  }
+
   testSpin?.addEventListener("click", async () => {
     statusMessage.textContent = "Queued manual test spin...";
     try {
@@ -298,7 +332,7 @@ async function initHome() {
   }
 
   requestAnimationFrame(render);
-  pollEvents();
+  listenEvents();
 }
 
 // SETTINGS PAGE